@@ -5,4 +5,7 @@ class SendMessageExeptinon(Exception):
 
 class NoAccessToApiExeption(Exception):
     """Исключение на доступ к API."""
-    pass
+
+    def __init__(self, message='', retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
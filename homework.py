@@ -1,36 +1,85 @@
-import json
+import asyncio
+import atexit
+import contextlib
+import functools
 import logging
+import logging.handlers
 import os
+import queue
+import random
+import sys
 import time
+from collections import deque, namedtuple
+from email.utils import parsedate_to_datetime
 from http import HTTPStatus
+from types import MappingProxyType
 
-import requests
+import aiohttp
+import orjson
 import telegram
+from aiolimiter import AsyncLimiter
 from dotenv import load_dotenv
+from telegram.request import HTTPXRequest
 
 import endpoint
 import exceptions
 
-logging.basicConfig(
-    level=logging.INFO,
-    filename='main.log',
-    filemode='w',
-    format='%(asctime)s,%(levelname)s, %(message)s, %(funcName)s, %(lineno)s'
-)
-
 load_dotenv()
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
-handler = logging.StreamHandler(stream='sys.stbout')
-logger.addHandler(handler)
+if not logger.handlers:
+    log_queue = queue.Queue(-1)
+    handler = logging.handlers.QueueHandler(log_queue)
+    logger.addHandler(handler)
+    log_listener = logging.handlers.QueueListener(
+        log_queue, logging.StreamHandler(stream=sys.stdout)
+    )
+    log_listener.start()
+    atexit.register(log_listener.stop)
+
+Tokens = namedtuple('Tokens', ('practicum', 'telegram', 'chat_id'))
+
+
+@functools.cache
+def _tokens():
+    """Один раз читает токены из переменных окружения."""
+    return Tokens(
+        practicum=os.getenv('PRACTICUM_TOKEN'),
+        telegram=os.getenv('TELEGRAM_TOKEN'),
+        chat_id=os.getenv('TELEGRAM_CHAT_ID')
+    )
 
-PRACTICUM_TOKEN = os.getenv('PRACTICUM_TOKEN')
-TELEGRAM_TOKEN = os.getenv('TELEGRAM_TOKEN')
-TELEGRAM_CHAT_ID = os.getenv('TELEGRAM_CHAT_ID')
+
+PRACTICUM_TOKEN, TELEGRAM_TOKEN, TELEGRAM_CHAT_ID = _tokens()
+
+LOG_FILE = 'main.log'
+LOG_BUFFER_SIZE = 8192
+LOG_FORMAT = (
+    '%(asctime)s,%(levelname)s, %(message)s, %(funcName)s, %(lineno)s'
+)
 
 TELEGRAM_RETRY_TIME = 600
-HEADERS = {'Authorization': f'OAuth {PRACTICUM_TOKEN}'}
+BACKOFF_BASE = 60
+BACKOFF_CAP = 3600
+BACKOFF_JITTER = 5
+ERROR_FINGERPRINT_LENGTH = 80
+ERROR_DEDUP_WINDOW = 600
+ERROR_DEDUP_SIZE = 16
+ERROR_MESSAGE_LIMIT = 200
+API_TIMEOUT = 30
+API_CONNECTIONS_LIMIT = 10
+API_KEEPALIVE_TIMEOUT = 75
+TELEGRAM_POOL_SIZE = 8
+TELEGRAM_TIMEOUT = 10
+TELEGRAM_GLOBAL_RATE = 25
+TELEGRAM_CHAT_RATE_PERIOD = 1.1
+TELEGRAM_MESSAGE_LIMIT = 4000
+SEND_QUEUE_SIZE = 4
+LOOP_BLOCK_THRESHOLD = 0.05
+HEADERS = MappingProxyType({'Authorization': f'OAuth {_tokens().practicum}'})
+_PARAMS = {'from_date': 0}
+_VALIDATORS = {}
 
 HOMEWORK_VERDICTS = {
     'approved': 'Работа проверена: ревьюеру всё понравилось. Ура!',
@@ -38,37 +87,201 @@ HOMEWORK_VERDICTS = {
     'rejected': 'Работа проверена: у ревьюера есть замечания.'
 }
 
+_MISSING = object()
+
+VERDICT_TEMPLATES = {
+    status: f'Изменился статус проверки работы "%s". {verdict}'
+    for status, verdict in HOMEWORK_VERDICTS.items()
+}
+
+
+class BufferedFileHandler(logging.FileHandler):
+    """Пишет лог в файл через буфер, сбрасывая его при заполнении и ошибках."""
+
+    def _open(self):
+        return open(
+            self.baseFilename, self.mode, buffering=LOG_BUFFER_SIZE,
+            encoding=self.encoding, errors=self.errors
+        )
 
-def send_message(bot, message):
+    def emit(self, record):
+        """Записывает запись в буфер без сброса на диск после каждой."""
+        if self.stream is None:
+            self.stream = self._open()
+        try:
+            self.stream.write(self.format(record) + self.terminator)
+            if record.levelno >= logging.ERROR:
+                self.flush()
+        except Exception:
+            self.handleError(record)
+
+
+async def send_message(bot, message):
     """Отправка сообщения в Telegram чат."""
     try:
-        bot.send_message(TELEGRAM_CHAT_ID, message)
+        await bot.send_message(TELEGRAM_CHAT_ID, message)
         logger.info('Сообщение успешно отправлено в Telegram')
+    except telegram.error.RetryAfter:
+        raise
     except Exception:
-        logger.error(f'Сообщение не отправилось: {message}')
+        logger.error('Сообщение не отправилось: %s', message)
         raise exceptions.SendMessageExeptinon
 
 
-def get_api_answer(current_timestamp):
+def _chunk_by_length(messages, limit, sep='\n\n'):
+    """Склеивает сообщения в блоки длиной не больше limit символов."""
+    chunk = []
+    length = 0
+    for message in messages:
+        extra = len(message) + len(sep) if chunk else len(message)
+        if chunk and length + extra > limit:
+            yield sep.join(chunk)
+            chunk = []
+            extra = len(message)
+            length = 0
+        chunk.append(message)
+        length += extra
+    if chunk:
+        yield sep.join(chunk)
+
+
+async def sender_worker(bot, send_queue):
+    """Отправляет сообщения из очереди с учетом лимитов Telegram."""
+    global_limiter = AsyncLimiter(TELEGRAM_GLOBAL_RATE, 1)
+    chat_limiter = AsyncLimiter(1, TELEGRAM_CHAT_RATE_PERIOD)
+    while True:
+        message = await send_queue.get()
+        while True:
+            try:
+                async with global_limiter, chat_limiter:
+                    await send_message(bot, message)
+            except telegram.error.RetryAfter as error:
+                logger.warning(
+                    'Превышен лимит Telegram, пауза %s с', error.retry_after
+                )
+                await asyncio.sleep(error.retry_after)
+                continue
+            except exceptions.SendMessageExeptinon:
+                pass
+            break
+        send_queue.task_done()
+
+
+def create_session():
+    """Создает сессию HTTP-клиента, переиспользуемую между запросами к API."""
+    return aiohttp.ClientSession(
+        timeout=aiohttp.ClientTimeout(total=API_TIMEOUT),
+        connector=aiohttp.TCPConnector(
+            limit=API_CONNECTIONS_LIMIT,
+            keepalive_timeout=API_KEEPALIVE_TIMEOUT
+        )
+    )
+
+
+def create_bot():
+    """Создает бота с пулом HTTP/2-соединений к Telegram Bot API."""
+    return telegram.Bot(
+        TELEGRAM_TOKEN,
+        request=HTTPXRequest(
+            connection_pool_size=TELEGRAM_POOL_SIZE,
+            http_version='2',
+            connect_timeout=TELEGRAM_TIMEOUT,
+            read_timeout=TELEGRAM_TIMEOUT
+        )
+    )
+
+
+def parse_retry_after(homework_status):
+    """Достает из ответа API паузу, запрошенную заголовком Retry-After."""
+    if (homework_status.status != HTTPStatus.TOO_MANY_REQUESTS
+            and homework_status.status < HTTPStatus.INTERNAL_SERVER_ERROR):
+        return None
+    retry_after = homework_status.headers.get('Retry-After')
+    if retry_after is None:
+        return None
+    try:
+        return max(0, int(retry_after))
+    except ValueError:
+        pass
+    try:
+        retry_date = parsedate_to_datetime(retry_after)
+    except (TypeError, ValueError):
+        return None
+    return max(0, retry_date.timestamp() - time.time())
+
+
+def get_retry_delay(error, attempt):
+    """Вычисляет паузу перед повторным запросом после ошибки."""
+    if (isinstance(error, exceptions.NoAccessToApiExeption)
+            and error.retry_after is not None):
+        return max(BACKOFF_BASE, error.retry_after)
+    delay = min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt)
+    return delay + random.uniform(0, BACKOFF_JITTER)
+
+
+def get_error_fingerprint(error):
+    """Возвращает короткий отпечаток ошибки для подавления повторов."""
+    return type(error).__name__, str(error)[:ERROR_FINGERPRINT_LENGTH]
+
+
+def format_error(error):
+    """Формирует короткое сообщение о сбое для отправки в Telegram."""
+    details = error.args[0] if error.args else ''
+    message = f'Сбой в работе программы: {type(error).__name__}: {details}'
+    return message[:ERROR_MESSAGE_LIMIT]
+
+
+def is_recent_error(fingerprint, recent_errors):
+    """Проверяет, встречалась ли ошибка недавно, и запоминает ее."""
+    now = time.monotonic()
+    while recent_errors and now - recent_errors[0][1] > ERROR_DEDUP_WINDOW:
+        recent_errors.popleft()
+    is_recent = any(seen == fingerprint for seen, _ in recent_errors)
+    recent_errors.append((fingerprint, now))
+    return is_recent
+
+
+def save_validators(homework_status):
+    """Запоминает ETag и Last-Modified для условного запроса к API."""
+    _VALIDATORS.clear()
+    etag = homework_status.headers.get('ETag')
+    if etag is not None:
+        _VALIDATORS['If-None-Match'] = etag
+    last_modified = homework_status.headers.get('Last-Modified')
+    if last_modified is not None:
+        _VALIDATORS['If-Modified-Since'] = last_modified
+
+
+async def get_api_answer(session, current_timestamp):
     """Делает запрос к эндпоинту API-сервиса."""
-    timestamp = current_timestamp or int(time.time())
-    params = {'from_date': timestamp}
+    _PARAMS['from_date'] = current_timestamp or time.time_ns() // 10 ** 9
+    headers = {**HEADERS, **_VALIDATORS} if _VALIDATORS else HEADERS
     try:
-        homework_status = requests.get(
-            endpoint.ENDPOINT, headers=HEADERS, params=params
-        )
-        if homework_status.status_code != HTTPStatus.OK:
-            message_error = (
-                f' ENDPOINT недоступен.'
-                f' Ошибка: {homework_status.status_code}'
-            )
-            logger.error(message_error)
-            raise exceptions.NoAccessToApiExeption(message_error)
-        return homework_status.json()
-    except json.JSONDecodeError:
-        message_json = 'Ответ не преобразовался в JSON'
+        async with session.get(
+            endpoint.ENDPOINT, headers=headers, params=_PARAMS
+        ) as homework_status:
+            if homework_status.status == HTTPStatus.NOT_MODIFIED:
+                logger.debug('Ответ API не изменился')
+                return {'homeworks': [], 'current_date': _PARAMS['from_date']}
+            if homework_status.status != HTTPStatus.OK:
+                message_error = (
+                    f' ENDPOINT недоступен.'
+                    f' Ошибка: {homework_status.status}'
+                )
+                logger.error(message_error)
+                raise exceptions.NoAccessToApiExeption(
+                    message_error,
+                    retry_after=parse_retry_after(homework_status)
+                )
+            response = orjson.loads(await homework_status.read())
+            save_validators(homework_status)
+            return response
+    except exceptions.NoAccessToApiExeption:
+        raise
+    except orjson.JSONDecodeError as error:
+        message_json = f'Ответ не преобразовался в JSON: {error}'
         logger.error(message_json)
-        raise json.JSONDecodeError
+        raise exceptions.NoAccessToApiExeption(message_json) from error
     except Exception:
         message = 'Нет доступа к API'
         logger.error(message)
@@ -77,14 +290,15 @@ def get_api_answer(current_timestamp):
 
 def check_response(response):
     """Проверка API на корректность."""
-    try:
-        homework = response['homeworks']
-    except KeyError:
-        raise KeyError('Ключ homeworks не доступен')
     if not isinstance(response, dict):
         message = 'response должен быть словарем'
         logger.error(message)
         raise TypeError(message)
+    homework = response.get('homeworks')
+    if homework is None:
+        message = 'Ключ homeworks не доступен'
+        logger.error(message)
+        raise KeyError(message)
     if not isinstance(homework, list):
         message_error = 'homework должен быть списком'
         logger.error(message_error)
@@ -94,15 +308,29 @@ def check_response(response):
 
 def parse_status(homework):
     """Извлекает из информации о домашней работе статус работы."""
-    homework_name = homework.get('homework_name')
-    homework_status = homework.get('status')
-
-    if homework_status not in HOMEWORK_VERDICTS:
+    template = VERDICT_TEMPLATES.get(homework.get('status'), _MISSING)
+    if template is _MISSING:
         message = 'Статус работы не определен.'
         logger.error(message)
         raise KeyError(message)
-    verdict = HOMEWORK_VERDICTS[homework_status]
-    return f'Изменился статус проверки работы "{homework_name}". {verdict}'
+    homework_name = homework.get('homework_name', _MISSING)
+    if homework_name is _MISSING:
+        message = 'Нет названия домашней работы.'
+        logger.error(message)
+        raise KeyError(message)
+    return template % homework_name
+
+
+def parse_statuses(homeworks):
+    """Разбирает статусы работ, не прерываясь на ошибке в одной из них."""
+    messages = []
+    errors = []
+    for homework in homeworks:
+        try:
+            messages.append(parse_status(homework))
+        except Exception as error:
+            errors.append(error)
+    return messages, errors
 
 
 def check_tokens():
@@ -115,42 +343,79 @@ def check_tokens():
     }
     for key, value in secret_key.items():
         if value is None:
-            logger.critical(
-                f'Нет переменной окружения: {key}'
-            )
+            logger.critical('Нет переменной окружения: %s', key)
             return False
     return True
 
 
-def main():
-    """Основная логика работы бота."""
-    if not check_tokens():
-        logger.critical('Отсутствуют важные переменные окружения')
-        exit()
-    bot = telegram.Bot(token=TELEGRAM_TOKEN)
-    current_timestamp = int(time.time())
+async def poller(session, send_queue):
+    """Опрашивает API и ставит сообщения об изменениях в очередь отправки."""
+    current_timestamp = time.time_ns() // 10 ** 9
 
-    box_error = ''
+    last_fingerprint = None
+    recent_errors = deque(maxlen=ERROR_DEDUP_SIZE)
+    attempt = 0
 
     while True:
         try:
-            response = get_api_answer(current_timestamp)
+            response = await get_api_answer(session, current_timestamp)
             homeworks = check_response(response)
-            current_timestamp = response.get('current_date')
-            for homework in homeworks:
-                message = parse_status(homework)
-                send_message(bot, message)
+            messages, errors = parse_statuses(homeworks)
+            for chunk in _chunk_by_length(messages, TELEGRAM_MESSAGE_LIMIT):
+                await send_queue.put(chunk)
 
         except Exception as error:
-            message = f'Сбой в работе программы: {error}'
-            if message != box_error:
-                send_message(bot, message)
-                box_error = message
-                time.sleep(TELEGRAM_RETRY_TIME)
+            _VALIDATORS.clear()
+            errors = [error]
+            delay = get_retry_delay(error, attempt)
+            attempt += 1
         else:
             logger.info('Сообщение отправлено')
-            time.sleep(TELEGRAM_RETRY_TIME)
+            current_timestamp = response.get('current_date')
+            last_fingerprint = None
+            attempt = 0
+            delay = TELEGRAM_RETRY_TIME
+        for error in errors:
+            fingerprint = get_error_fingerprint(error)
+            is_recent = is_recent_error(fingerprint, recent_errors)
+            if fingerprint != last_fingerprint and not is_recent:
+                await send_queue.put(format_error(error))
+                last_fingerprint = fingerprint
+        await asyncio.sleep(delay)
+
+
+def watch_event_loop():
+    """В режиме разработки (DEV) сообщает о блокировках цикла событий."""
+    if not os.getenv('DEV'):
+        return contextlib.nullcontext()
+    from pyleak import no_event_loop_blocking
+    return no_event_loop_blocking(
+        action='log', threshold=LOOP_BLOCK_THRESHOLD, logger=logger
+    )
+
+
+async def main():
+    """Основная логика работы бота."""
+    if not check_tokens():
+        logger.critical('Отсутствуют важные переменные окружения')
+        sys.exit(1)
+
+    send_queue = asyncio.Queue(maxsize=SEND_QUEUE_SIZE)
+
+    async with create_bot() as bot, create_session() as session:
+        async with watch_event_loop():
+            await asyncio.gather(
+                poller(session, send_queue),
+                sender_worker(bot, send_queue)
+            )
 
 
 if __name__ == '__main__':
-    main()
+    file_handler = BufferedFileHandler(
+        LOG_FILE, mode='a', encoding='utf-8', delay=True
+    )
+    atexit.register(file_handler.flush)
+    logging.basicConfig(
+        level=logging.INFO, format=LOG_FORMAT, handlers=[file_handler]
+    )
+    asyncio.run(main())
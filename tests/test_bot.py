@@ -1,7 +1,11 @@
+import asyncio
+import json
 import os
+import time
+from email.utils import formatdate
 from http import HTTPStatus
+from types import SimpleNamespace
 
-import requests
 import telegram
 import utils
 
@@ -43,15 +47,34 @@ class MockResponseGET:
             'домашней работы `from_date` передаете timestamp'
         )
         self.random_timestamp = random_timestamp
-        self.status_code = http_status
+        self.status = http_status
+        self.headers = {}
 
-    def json(self):
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        return False
+
+    async def json(self):
         data = {
             "homeworks": [],
             "current_date": self.random_timestamp
         }
         return data
 
+    async def read(self):
+        return json.dumps(await self.json()).encode()
+
+
+class MockClientSession:
+
+    def __init__(self, response_get):
+        self.response_get = response_get
+
+    def get(self, url, **kwargs):
+        return self.response_get(url, **kwargs)
+
 
 class MockTelegramBot:
 
@@ -61,7 +84,7 @@ class MockTelegramBot:
         )
         self.random_timestamp = random_timestamp
 
-    def send_message(self, chat_id=None, text=None, **kwargs):
+    async def send_message(self, chat_id=None, text=None, **kwargs):
         assert chat_id is not None, (
             'Проверьте, что вы передали chat_id= при отправке '
             'сообщения ботом Telegram'
@@ -178,6 +201,46 @@ class TestHomework:
         import homework
         utils.check_function(homework, 'send_message', 2)
 
+    def test_sender_worker_retry_after(self, monkeypatch):
+        sent = []
+        calls = []
+
+        class MockFloodBot:
+
+            async def send_message(self, chat_id=None, text=None, **kwargs):
+                calls.append(text)
+                if len(calls) == 1:
+                    raise telegram.error.RetryAfter(0)
+                if text == 'broken':
+                    raise telegram.error.BadRequest('Bad Request')
+                sent.append(text)
+
+        import homework
+
+        monkeypatch.setattr(homework, 'TELEGRAM_CHAT_RATE_PERIOD', 0.01)
+
+        func_name = 'sender_worker'
+
+        async def run_worker():
+            send_queue = asyncio.Queue()
+            for message in ('first', 'broken', 'last'):
+                send_queue.put_nowait(message)
+            worker = asyncio.create_task(
+                homework.sender_worker(MockFloodBot(), send_queue)
+            )
+            await asyncio.wait_for(send_queue.join(), timeout=5)
+            worker.cancel()
+
+        asyncio.run(run_worker())
+        assert calls == ['first', 'first', 'broken', 'last'], (
+            f'Убедитесь, что функция `{func_name}` после RetryAfter '
+            'повторяет то же сообщение, сохраняя порядок'
+        )
+        assert sent == ['first', 'last'], (
+            f'Убедитесь, что функция `{func_name}` пропускает сообщение, '
+            'которое не удалось отправить, и продолжает работу'
+        )
+
     def test_get_api_answers(self, monkeypatch, random_timestamp,
                              current_timestamp, api_url):
         def mock_response_get(*args, **kwargs):
@@ -186,14 +249,16 @@ class TestHomework:
                 current_timestamp=current_timestamp, **kwargs
             )
 
-        monkeypatch.setattr(requests, 'get', mock_response_get)
+        session = MockClientSession(mock_response_get)
 
         import homework
 
         func_name = 'get_api_answer'
-        utils.check_function(homework, func_name, 1)
+        utils.check_function(homework, func_name, 2)
 
-        result = homework.get_api_answer(current_timestamp)
+        result = asyncio.run(
+            homework.get_api_answer(session, current_timestamp)
+        )
         assert type(result) == dict, (
             f'Проверьте, что из функции `{func_name}` '
             'возвращается словарь'
@@ -224,7 +289,7 @@ class TestHomework:
                 http_status=HTTPStatus.INTERNAL_SERVER_ERROR, **kwargs
             )
 
-            def json_invalid():
+            async def json_invalid():
                 data = {
                 }
                 return data
@@ -232,13 +297,15 @@ class TestHomework:
             response.json = json_invalid
             return response
 
-        monkeypatch.setattr(requests, 'get', mock_500_response_get)
+        session = MockClientSession(mock_500_response_get)
 
         import homework
 
         func_name = 'get_api_answer'
         try:
-            homework.get_api_answer(current_timestamp)
+            asyncio.run(
+                homework.get_api_answer(session, current_timestamp)
+            )
         except:
             pass
         else:
@@ -247,6 +314,185 @@ class TestHomework:
                 'когда API возвращает код, отличный от 200'
             )
 
+    def test_get_invalid_json_api_answer(self, random_timestamp,
+                                         current_timestamp, api_url):
+        def mock_invalid_json_response_get(*args, **kwargs):
+            response = MockResponseGET(
+                *args, random_timestamp=random_timestamp,
+                current_timestamp=current_timestamp, **kwargs
+            )
+
+            async def read_invalid():
+                return b'<html>not json</html>'
+
+            response.read = read_invalid
+            return response
+
+        session = MockClientSession(mock_invalid_json_response_get)
+
+        import exceptions
+        import homework
+
+        func_name = 'get_api_answer'
+        try:
+            asyncio.run(
+                homework.get_api_answer(session, current_timestamp)
+            )
+        except exceptions.NoAccessToApiExeption:
+            pass
+        else:
+            assert False, (
+                f'Убедитесь, что функция `{func_name}` выбрасывает '
+                '`NoAccessToApiExeption`, когда ответ API не является JSON'
+            )
+
+    def test_get_not_modified_api_answer(self, monkeypatch, random_timestamp,
+                                         current_timestamp, api_url):
+        def mock_etag_response_get(*args, **kwargs):
+            response = MockResponseGET(
+                *args, random_timestamp=random_timestamp,
+                current_timestamp=current_timestamp, **kwargs
+            )
+            if kwargs['headers'].get('If-None-Match') == '"v1"':
+                response.status = HTTPStatus.NOT_MODIFIED
+            response.headers = {'ETag': '"v1"'}
+            return response
+
+        session = MockClientSession(mock_etag_response_get)
+
+        import homework
+
+        monkeypatch.setattr(homework, '_VALIDATORS', {})
+
+        func_name = 'get_api_answer'
+        asyncio.run(homework.get_api_answer(session, current_timestamp))
+        result = asyncio.run(
+            homework.get_api_answer(session, current_timestamp)
+        )
+        assert result['homeworks'] == [], (
+            f'Убедитесь, что функция `{func_name}` при ответе 304 '
+            'возвращает пустой список домашних работ'
+        )
+        assert result['current_date'] == current_timestamp, (
+            f'Убедитесь, что функция `{func_name}` при ответе 304 '
+            'сохраняет прежнее значение `current_date`'
+        )
+
+    def test_poller_not_modified_after_processing_error(
+            self, monkeypatch, random_timestamp, api_url):
+        requests_headers = []
+
+        def mock_etag_response_get(url, **kwargs):
+            requests_headers.append(dict(kwargs['headers']))
+            response = MockResponseGET(
+                url, random_timestamp=random_timestamp,
+                current_timestamp=kwargs['params']['from_date'], **kwargs
+            )
+            if 'If-None-Match' in kwargs['headers']:
+                response.status = HTTPStatus.NOT_MODIFIED
+
+            async def invalid_homeworks_json():
+                return {
+                    'homeworks': {'homework_name': 'hw123'},
+                    'current_date': random_timestamp
+                }
+
+            response.json = invalid_homeworks_json
+            response.headers = {'ETag': '"v1"'}
+            return response
+
+        session = MockClientSession(mock_etag_response_get)
+
+        import homework
+
+        monkeypatch.setattr(homework, '_VALIDATORS', {})
+        monkeypatch.setattr(homework, 'get_retry_delay', lambda *args: 0)
+
+        async def run_poller():
+            poller = asyncio.create_task(
+                homework.poller(session, asyncio.Queue())
+            )
+            while len(requests_headers) < 2 and not poller.done():
+                await asyncio.sleep(0)
+            poller.cancel()
+
+        asyncio.run(run_poller())
+        assert len(requests_headers) >= 2, (
+            'Убедитесь, что `poller` продолжает опрашивать API после ошибки'
+        )
+        assert 'If-None-Match' not in requests_headers[1], (
+            'Убедитесь, что после ошибки обработки ответа следующий запрос '
+            'к API отправляется без условных заголовков'
+        )
+
+    def test_parse_retry_after(self):
+        import homework
+
+        func_name = 'parse_retry_after'
+
+        def response(status, headers):
+            return SimpleNamespace(status=status, headers=headers)
+
+        result = homework.parse_retry_after(
+            response(HTTPStatus.TOO_MANY_REQUESTS, {'Retry-After': '120'})
+        )
+        assert result == 120, (
+            f'Убедитесь, что функция `{func_name}` читает паузу в секундах '
+            'из заголовка Retry-After ответа 429'
+        )
+        retry_date = formatdate(time.time() + 300, usegmt=True)
+        result = homework.parse_retry_after(
+            response(HTTPStatus.SERVICE_UNAVAILABLE, {'Retry-After': retry_date})
+        )
+        assert 290 < result <= 300, (
+            f'Убедитесь, что функция `{func_name}` понимает HTTP-дату '
+            'в заголовке Retry-After ответа 5xx'
+        )
+        for status, headers in (
+            (HTTPStatus.SERVICE_UNAVAILABLE, {'Retry-After': 'soon'}),
+            (HTTPStatus.INTERNAL_SERVER_ERROR, {}),
+            (HTTPStatus.NOT_FOUND, {'Retry-After': '120'}),
+        ):
+            assert homework.parse_retry_after(
+                response(status, headers)
+            ) is None, (
+                f'Убедитесь, что функция `{func_name}` возвращает None '
+                f'для ответа {status} с заголовками {headers}'
+            )
+
+    def test_get_retry_delay(self):
+        import exceptions
+        import homework
+
+        func_name = 'get_retry_delay'
+        error = exceptions.NoAccessToApiExeption('503', retry_after=0)
+        assert homework.get_retry_delay(error, 0) == homework.BACKOFF_BASE, (
+            f'Убедитесь, что функция `{func_name}` не возвращает паузу '
+            'короче BACKOFF_BASE при Retry-After: 0'
+        )
+        error = exceptions.NoAccessToApiExeption('429', retry_after=900)
+        assert homework.get_retry_delay(error, 0) == 900, (
+            f'Убедитесь, что функция `{func_name}` соблюдает паузу '
+            'из Retry-After'
+        )
+        error = ConnectionError('Нет сети')
+        delay = homework.get_retry_delay(error, 2)
+        assert (
+            homework.BACKOFF_BASE * 4 <= delay
+            <= homework.BACKOFF_BASE * 4 + homework.BACKOFF_JITTER
+        ), (
+            f'Убедитесь, что функция `{func_name}` удваивает паузу '
+            'с каждой попыткой и добавляет случайную добавку'
+        )
+        delay = homework.get_retry_delay(error, 20)
+        assert (
+            homework.BACKOFF_CAP <= delay
+            <= homework.BACKOFF_CAP + homework.BACKOFF_JITTER
+        ), (
+            f'Убедитесь, что функция `{func_name}` ограничивает паузу '
+            'значением BACKOFF_CAP'
+        )
+
     def test_parse_status(self, random_timestamp):
         test_data = {
             "id": 123,
@@ -291,6 +537,80 @@ class TestHomework:
             f'`{status}` в возврате функции parse_status()'
         )
 
+    def test_parse_statuses_skips_invalid_homework(self, random_timestamp):
+        homeworks = [
+            {'homework_name': str(random_timestamp), 'status': 'approved'},
+            {'homework_name': 'hw123', 'status': 'unknown'},
+            {'homework_name': 'hw456', 'status': 'rejected'},
+        ]
+
+        import homework
+
+        func_name = 'parse_statuses'
+        messages, errors = homework.parse_statuses(homeworks)
+        assert len(messages) == 2, (
+            f'Убедитесь, что функция `{func_name}` возвращает вердикты '
+            'для всех корректных домашних работ'
+        )
+        assert messages[0].endswith(self.HOMEWORK_STATUSES['approved']), (
+            f'Убедитесь, что функция `{func_name}` сохраняет порядок работ'
+        )
+        assert len(errors) == 1 and isinstance(errors[0], KeyError), (
+            f'Убедитесь, что функция `{func_name}` возвращает ошибку '
+            'для работы с недокументированным статусом'
+        )
+
+    def test_is_recent_error(self, monkeypatch):
+        import homework
+
+        now = [1000.0]
+        monkeypatch.setattr(homework.time, 'monotonic', lambda: now[0])
+
+        func_name = 'is_recent_error'
+        recent_errors = homework.deque(maxlen=homework.ERROR_DEDUP_SIZE)
+        first = homework.get_error_fingerprint(KeyError('homeworks'))
+        second = homework.get_error_fingerprint(TypeError('homework'))
+        assert not homework.is_recent_error(first, recent_errors)
+        assert not homework.is_recent_error(second, recent_errors)
+        now[0] += 1
+        assert homework.is_recent_error(first, recent_errors), (
+            f'Убедитесь, что функция `{func_name}` подавляет ошибку, '
+            'которая чередуется с другой в пределах окна'
+        )
+        assert homework.is_recent_error(second, recent_errors), (
+            f'Убедитесь, что функция `{func_name}` подавляет ошибку, '
+            'которая чередуется с другой в пределах окна'
+        )
+        now[0] += homework.ERROR_DEDUP_WINDOW + 1
+        assert not homework.is_recent_error(first, recent_errors), (
+            f'Убедитесь, что функция `{func_name}` забывает ошибку '
+            'по истечении ERROR_DEDUP_WINDOW'
+        )
+
+    def test_chunk_by_length(self):
+        import homework
+
+        func_name = '_chunk_by_length'
+        chunks = list(homework._chunk_by_length(['aaa', 'bb'], 7))
+        assert chunks == ['aaa\n\nbb'], (
+            f'Убедитесь, что функция `{func_name}` склеивает сообщения, '
+            'если вместе с разделителем они ровно укладываются в лимит'
+        )
+        chunks = list(homework._chunk_by_length(['aaa', 'bb', 'c'], 7))
+        assert chunks == ['aaa\n\nbb', 'c'], (
+            f'Убедитесь, что функция `{func_name}` начинает новый блок, '
+            'когда сообщение не укладывается в лимит'
+        )
+        chunks = list(homework._chunk_by_length(['a', 'x' * 10, 'b'], 5))
+        assert chunks == ['a', 'x' * 10, 'b'], (
+            f'Убедитесь, что функция `{func_name}` отдает сообщение '
+            'длиннее лимита отдельным блоком'
+        )
+        assert list(homework._chunk_by_length([], 7)) == [], (
+            f'Убедитесь, что функция `{func_name}` не возвращает блоков '
+            'для пустого списка сообщений'
+        )
+
     def test_check_response(self, monkeypatch, random_timestamp,
                             current_timestamp, api_url):
         def mock_response_get(*args, **kwargs):
@@ -300,7 +620,7 @@ class TestHomework:
                 **kwargs
             )
 
-            def valid_response_json():
+            async def valid_response_json():
                 data = {
                     "homeworks": [
                         {
@@ -315,12 +635,14 @@ class TestHomework:
             response.json = valid_response_json
             return response
 
-        monkeypatch.setattr(requests, 'get', mock_response_get)
+        session = MockClientSession(mock_response_get)
 
         import homework
 
         func_name = 'check_response'
-        response = homework.get_api_answer(current_timestamp)
+        response = asyncio.run(
+            homework.get_api_answer(session, current_timestamp)
+        )
         status = homework.check_response(response)
         assert status, (
             f'Убедитесь, что функция `{func_name} '
@@ -337,7 +659,7 @@ class TestHomework:
                 **kwargs
             )
 
-            def valid_response_json():
+            async def valid_response_json():
                 data = {
                     "homeworks": [
                         {
@@ -352,12 +674,14 @@ class TestHomework:
             response.json = valid_response_json
             return response
 
-        monkeypatch.setattr(requests, 'get', mock_response_get)
+        session = MockClientSession(mock_response_get)
 
         import homework
 
         func_name = 'parse_status'
-        response = homework.get_api_answer(current_timestamp)
+        response = asyncio.run(
+            homework.get_api_answer(session, current_timestamp)
+        )
         homeworks = homework.check_response(response)
         for hw in homeworks:
             status_message = None
@@ -386,7 +710,7 @@ class TestHomework:
                 **kwargs
             )
 
-            def valid_response_json():
+            async def valid_response_json():
                 data = {
                     "homeworks": [
                         {
@@ -400,12 +724,14 @@ class TestHomework:
             response.json = valid_response_json
             return response
 
-        monkeypatch.setattr(requests, 'get', mock_response_get)
+        session = MockClientSession(mock_response_get)
 
         import homework
 
         func_name = 'parse_status'
-        response = homework.get_api_answer(current_timestamp)
+        response = asyncio.run(
+            homework.get_api_answer(session, current_timestamp)
+        )
         homeworks = homework.check_response(response)
         for hw in homeworks:
             status_message = None
@@ -434,7 +760,7 @@ class TestHomework:
                 **kwargs
             )
 
-            def valid_response_json():
+            async def valid_response_json():
                 data = {
                     "homeworks": [
                         {
@@ -448,12 +774,14 @@ class TestHomework:
             response.json = valid_response_json
             return response
 
-        monkeypatch.setattr(requests, 'get', mock_response_get)
+        session = MockClientSession(mock_response_get)
 
         import homework
 
         func_name = 'parse_status'
-        response = homework.get_api_answer(current_timestamp)
+        response = asyncio.run(
+            homework.get_api_answer(session, current_timestamp)
+        )
         homeworks = homework.check_response(response)
         try:
             for hw in homeworks:
@@ -475,7 +803,7 @@ class TestHomework:
                 **kwargs
             )
 
-            def json_invalid():
+            async def json_invalid():
                 data = {
                     "current_date": random_timestamp
                 }
@@ -484,12 +812,14 @@ class TestHomework:
             response.json = json_invalid
             return response
 
-        monkeypatch.setattr(requests, 'get', mock_no_homeworks_response_get)
+        session = MockClientSession(mock_no_homeworks_response_get)
 
         import homework
 
         func_name = 'check_response'
-        result = homework.get_api_answer(current_timestamp)
+        result = asyncio.run(
+            homework.get_api_answer(session, current_timestamp)
+        )
         try:
             homework.check_response(result)
         except:
@@ -510,7 +840,7 @@ class TestHomework:
                 **kwargs
             )
 
-            def valid_response_json():
+            async def valid_response_json():
                 data = [{
                     "homeworks": [
                         {
@@ -525,12 +855,14 @@ class TestHomework:
             response.json = valid_response_json
             return response
 
-        monkeypatch.setattr(requests, 'get', mock_response_get)
+        session = MockClientSession(mock_response_get)
 
         import homework
 
         func_name = 'check_response'
-        response = homework.get_api_answer(current_timestamp)
+        response = asyncio.run(
+            homework.get_api_answer(session, current_timestamp)
+        )
         try:
             status = homework.check_response(response)
         except TypeError:
@@ -551,7 +883,7 @@ class TestHomework:
                 **kwargs
             )
 
-            def valid_response_json():
+            async def valid_response_json():
                 data = {
                     "homeworks":
                         {
@@ -565,12 +897,14 @@ class TestHomework:
             response.json = valid_response_json
             return response
 
-        monkeypatch.setattr(requests, 'get', mock_response_get)
+        session = MockClientSession(mock_response_get)
 
         import homework
 
         func_name = 'check_response'
-        response = homework.get_api_answer(current_timestamp)
+        response = asyncio.run(
+            homework.get_api_answer(session, current_timestamp)
+        )
         try:
             homeworks = homework.check_response(response)
         except:
@@ -591,7 +925,7 @@ class TestHomework:
                 **kwargs
             )
 
-            def json_invalid():
+            async def json_invalid():
                 data = {
                 }
                 return data
@@ -599,12 +933,14 @@ class TestHomework:
             response.json = json_invalid
             return response
 
-        monkeypatch.setattr(requests, 'get', mock_empty_response_get)
+        session = MockClientSession(mock_empty_response_get)
 
         import homework
 
         func_name = 'check_response'
-        result = homework.get_api_answer(current_timestamp)
+        result = asyncio.run(
+            homework.get_api_answer(session, current_timestamp)
+        )
         try:
             homework.check_response(result)
         except:
@@ -626,13 +962,15 @@ class TestHomework:
             )
             return response
 
-        monkeypatch.setattr(requests, 'get', mock_response_get)
+        session = MockClientSession(mock_response_get)
 
         import homework
 
         func_name = 'check_response'
         try:
-            homework.get_api_answer(current_timestamp)
+            asyncio.run(
+                homework.get_api_answer(session, current_timestamp)
+            )
         except:
             pass
         else: